@@ -1,8 +1,7 @@
-from fastapi import FastAPI, UploadFile, File, Request, Path, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, UploadFile, File, Header, Request, Path, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import requests
 import os
 import assemblyai as aai
 from assemblyai.streaming.v3 import (
@@ -16,28 +15,85 @@ from assemblyai.streaming.v3 import (
     TurnEvent,
 )
 import google.generativeai as genai
-from typing import Dict, List, Any, AsyncGenerator
+from google.generativeai import client as genai_client
+from typing import Dict, List, Any, AsyncGenerator, Callable, Literal, Optional, Protocol, Set, Tuple
 import logging
 import asyncio
 import websockets
-import json
+import re
 import base64
+import hashlib
+import time
+from dataclasses import asdict, dataclass
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import uuid
+import weakref
 import aiohttp
+import orjson
+import janus
+from cachetools import LRUCache, TTLCache
+import redis.asyncio as redis
 import ssl
-from newsapi import NewsApiClient
 from pydantic import BaseModel, Field
+from pydantic_core import to_json
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Timeout applied to every outbound HTTP call made through the shared session
+HTTP_TIMEOUT_SECONDS = 30
+# Connection pool shared by all Murf and NewsAPI calls
+HTTP_POOL_LIMIT = 100
+HTTP_KEEPALIVE_SECONDS = 75
+# Origins the pool connects to at startup, so the first news or Murf REST
+# call of a turn doesn't also pay for DNS and the TLS handshake
+WARMUP_URLS = ("https://api.murf.ai", "https://newsapi.org")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create one pooled HTTP session for the app lifetime and close it on shutdown"""
+    app.state.http = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=HTTP_POOL_LIMIT, keepalive_timeout=HTTP_KEEPALIVE_SECONDS),
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS)
+    )
+    app.state.gemini_models = LRUCache(maxsize=GEMINI_MODEL_CACHE_SIZE)
+    app.state.news_lock = asyncio.Lock()
+    app.state.assembly_executor = ThreadPoolExecutor(max_workers=ASSEMBLY_MAX_WORKERS, thread_name_prefix="asr")
+    app.state.active_streams = 0
+    if HISTORY_BACKEND == "redis":
+        app.state.redis = redis.Redis.from_url(REDIS_URL)
+        app.state.history_store = RedisStore(app.state.redis, "history:", SESSION_TTL_SECONDS)
+        app.state.key_store = RedisStore(
+            app.state.redis, "keys:", None,
+            encode=asdict, decode=lambda record: Keys(**record)
+        )
+    else:
+        app.state.redis = None
+        app.state.history_store = InMemoryStore(MAX_SESSIONS)
+        app.state.key_store = InMemoryStore(MAX_SESSIONS)
+    logger.info(f"Session state backend: {HISTORY_BACKEND}")
+    warmup_task = asyncio.create_task(warm_up_http(app.state.http))
+    try:
+        yield
+    finally:
+        warmup_task.cancel()
+        await app.state.http.close()
+        if app.state.redis is not None:
+            await app.state.redis.aclose()
+        app.state.assembly_executor.shutdown(wait=False)
+
+
 # App setup
 app = FastAPI(
     title="Murf AI Agent - Streaming Edition",
     description="A modern AI voice companion with real-time streaming",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -49,16 +105,96 @@ class ApiKeys(BaseModel):
     murf: str = Field(..., alias="MURF_API_KEY")
     newsapi: str = Field(..., alias="NEWS_API_KEY")
 
-# --- MODIFIED: This will now be populated exclusively from the UI ---
-user_api_keys: Dict[str, str] = {}
+
+@dataclass(frozen=True)
+class Keys:
+    """Snapshot of one client's API keys
+
+    Saving keys replaces the snapshot as a whole, so a connection keeps the
+    instance it loaded without copying it. Slots are declared by hand because
+    dataclass(slots=True) needs Python 3.10.
+    """
+    __slots__ = ("assemblyai", "gemini", "murf", "newsapi")
+    assemblyai: str
+    gemini: str
+    murf: str
+    newsapi: str
+
+    def complete(self) -> bool:
+        return all((self.assemblyai, self.gemini, self.murf, self.newsapi))
+
+
+NO_KEYS = Keys(assemblyai="", gemini="", murf="", newsapi="")
+
+
+# JSON messages sent to the browser over the audio WebSocket
+class TranscriptMessage(BaseModel):
+    type: Literal["transcript"] = "transcript"
+    text: str
+    is_final: bool
+    end_of_turn: bool
+
+
+class LlmStartMessage(BaseModel):
+    type: Literal["llm_start"] = "llm_start"
+    message: str = "Generating AI response..."
+
+
+class FirstTokenMessage(BaseModel):
+    type: Literal["first_token"] = "first_token"
+    ts: float
+    ttft_ms: int
+
+
+class LlmChunkBatchMessage(BaseModel):
+    type: Literal["llm_chunk_batch"] = "llm_chunk_batch"
+    texts: List[str]
+
+
+class LlmCompleteMessage(BaseModel):
+    type: Literal["llm_complete"] = "llm_complete"
+    text: str
+
+
+class LlmErrorMessage(BaseModel):
+    type: Literal["llm_error"] = "llm_error"
+    message: str
+
+
+class InterruptMessage(BaseModel):
+    type: Literal["interrupt"] = "interrupt"
+
+
+class ErrorMessage(BaseModel):
+    type: Literal["error"] = "error"
+    message: str
 
 
 # Static context ID for Murf WebSocket (to avoid context limit issues)
 MURF_CONTEXT_ID = "murf-streaming-context-2024"
 
-# In-memory datastore for chat history
-chat_histories: Dict[str, List[Dict[str, Any]]] = {}
-MAX_HISTORY_MESSAGES = 50
+# Chat histories (per session) and API keys (per browser client) live in a
+# SessionStore: process memory by default, or Redis with HISTORY_BACKEND=redis
+# so that several workers share them
+HISTORY_BACKEND = os.environ.get("HISTORY_BACKEND", "memory")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+MAX_SESSIONS = 10_000
+# Histories expire an hour after their last turn. Keys never expire: the page
+# only re-sends them on load, so a long-open tab would otherwise lose them.
+SESSION_TTL_SECONDS = 3600
+
+# Keeps fire-and-forget tasks referenced until they finish
+background_tasks: Set[asyncio.Task] = set()
+
+# Serialises Gemini turns per session; a lock disappears once no turn holds it
+session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+# History is an append-only window: it grows until it holds about twice
+# MAX_HISTORY_TOKENS and is then cut back to the newest MAX_HISTORY_TOKENS.
+# Between cuts the prefix sent to Gemini is unchanged, so provider-side
+# prompt caching keeps hitting.
+MAX_HISTORY_TOKENS = 4000
+CHARS_PER_TOKEN = 4
 
 AI_SYSTEM_PROMPT = """
 You are Meraki, a cheerful and funny AI assistant with the personality traits of Spider-Man. Your characteristics:
@@ -90,157 +226,733 @@ SPECIAL SKILL - "SPIDER-SENSE" FOR NEWS:
 Remember: You're like the friendly neighborhood Spider-Man but as an AI - helpful, witty, and serious when it counts!
 """
 
+GEMINI_MODEL_NAME = "gemini-1.5-flash"
+# Chat and summary models kept per Gemini API key, each bound to a client for
+# its own key, so one client's request can never go out on another's key
+GEMINI_MODEL_CACHE_SIZE = 64
+
+# Messages cut from a history window are condensed by a smaller model into a
+# synopsis, stored as a user/model pair at the head of the history
+SUMMARY_MODEL_NAME = "gemini-1.5-flash-8b"
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and Meraki, an AI voice assistant, "
+    "in a few sentences. Keep names, facts and open questions Meraki should remember.\n\n"
+)
+SYNOPSIS_PREFIX = "Summary of our earlier conversation: "
+SYNOPSIS_ACK = "Got it, I'll keep that in mind."
+
+# NewsAPI "everything" query; works on the free plan
+NEWS_API_URL = "https://newsapi.org/v2/everything"
+NEWS_API_PARAMS = {
+    "q": "AI",
+    "language": "en",
+    "sortBy": "publishedAt",
+    "pageSize": 5
+}
+
+NEWS_RE = re.compile(r"\b(?:news|headlines|latest|happening)\b", re.IGNORECASE)
+
+# Headlines move on the order of minutes, so news turns reuse a recent fetch
+NEWS_CACHE_TTL_SECONDS = 120
+news_cache: TTLCache = TTLCache(maxsize=16, ttl=NEWS_CACHE_TTL_SECONDS)
+
 FALLBACK_AUDIO_PATH = "static/fallback.mp3"
 FALLBACK_TEXT = "I'm having trouble connecting right now. Please try again."
 
 # Murf WebSocket configuration
 MURF_WS_URL = "wss://api.murf.ai/v1/speech/generate-stream"
+# Keepalive pings stop idle sockets from being dropped behind NAT. Audio
+# frames can exceed the default 1 MiB limit, and MP3 gains nothing from
+# permessage-deflate, so size limits and compression are both off.
+MURF_WS_PING_INTERVAL = 20
+MURF_WS_PING_TIMEOUT = 20
+
+# Murf REST configuration; the per-call payload and headers extend these
+MURF_REST_URL = "https://api.murf.ai/v1/speech/generate"
+MURF_PAYLOAD_BASE = {
+    "format": "MP3",
+    "rate": 0,
+    "pitch": 0,
+    "emphasis": {}
+}
+MURF_HEADERS_BASE = {"Content-Type": "application/json"}
+
+# REST fallback renders speech one sentence at a time as the LLM produces it.
+# A boundary needs a capital or quote after the break, so decimals, URLs and
+# most lowercase abbreviations stay inside their sentence. Text that runs past
+# SENTENCE_MAX_CHARS without an end is cut at a clause or word break.
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z\"'])")
+SENTENCE_MAX_CHARS = 200
+# Sentences rendered by the Murf REST API at the same time
+MURF_REST_MAX_RENDERS = 3
+
+# Size of each audio piece read from Murf and forwarded to the browser
+MURF_AUDIO_CHUNK_SIZE = 3072
+
+# Audio goes to the browser as binary WebSocket frames: this tag byte, then
+# raw MP3 bytes. Control messages are JSON, which always starts with "{", so
+# the browser can tell the two apart by the first byte.
+AUDIO_FRAME_TAG = b"\x01"
+
+# Microphone audio buffered between the browser and the AssemblyAI stream, in
+# a janus queue: awaited by the receive loop, blocking for the SDK's thread.
+# When the buffer is full the receive loop waits for the recognizer to catch
+# up, which lets TCP flow control slow the browser down instead of dropping audio.
+AUDIO_QUEUE_MAXSIZE = 100
+AUDIO_QUEUE_HIGH_WATERMARK = int(AUDIO_QUEUE_MAXSIZE * 0.8)
+AUDIO_QUEUE_PUT_TIMEOUT = 5
+
+# AssemblyAI's stream() blocks a thread for the whole connection. These threads
+# get their own pool so long-lived streams can't starve the default executor
+# used by asyncio.to_thread.
+# One thread per connection, so this also caps concurrent connections; sockets
+# past it are rejected instead of waiting in the executor queue
+ASSEMBLY_MAX_WORKERS = int(os.environ.get("ASSEMBLY_MAX_STREAMS", 32))
+ASSEMBLY_SHUTDOWN_TIMEOUT = 2
+
+# Rendered Murf audio kept in memory so repeated lines skip synthesis
+TTS_CACHE_MAX_ENTRIES = 500
+TTS_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Partial transcripts at or above this end-of-turn confidence start a
+# speculative Gemini request before the user has finished speaking. Short
+# partials are skipped and a new speculation waits out the interval after the
+# last one, so a stream of partials can't fan out into a request per word
+SPECULATION_MIN_CONFIDENCE = 0.8
+SPECULATION_MIN_WORDS = 3
+SPECULATION_MIN_INTERVAL = 0.75
+
+# LLM text goes to the browser at most once per interval (the first chunk goes
+# straight away), or sooner once more than LLM_CHUNK_MAX_PENDING have queued
+LLM_CHUNK_FLUSH_INTERVAL = 0.04
+LLM_CHUNK_MAX_PENDING = 8
+
+# Pushed onto a stream's queue to tell its consumer there is nothing more to read
+_END_OF_STREAM = object()
+
+
+class TTSCache:
+    """LRU cache of rendered audio keyed by voice and text, bounded by entry count and total size"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict[str, List[bytes]] = OrderedDict()
+
+    @staticmethod
+    def key(text: str, voice_id: str) -> str:
+        return hashlib.sha256(f"{voice_id}|{text}".encode()).hexdigest()
+
+    def get(self, key: str):
+        pieces = self._entries.get(key)
+        if pieces is not None:
+            self._entries.move_to_end(key)
+        return pieces
+
+    def put(self, key: str, pieces: List[bytes]):
+        size = sum(len(piece) for piece in pieces)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.total_bytes -= sum(len(piece) for piece in self._entries.pop(key))
+        self._entries[key] = pieces
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= sum(len(piece) for piece in evicted)
+
+
+tts_cache = TTSCache(TTS_CACHE_MAX_ENTRIES, TTS_CACHE_MAX_BYTES)
+
+
+class SessionStore(Protocol):
+    """Keyed store for session state; shared backends serialize values as JSON"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    async def put(self, key: str, value: Any):
+        ...
+
+    async def delete(self, key: str):
+        ...
+
+
+class InMemoryStore:
+    """Process-local SessionStore that keeps the most recently used entries, as the objects stored"""
+
+    def __init__(self, maxsize: int):
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._entries.get(key)
+
+    async def put(self, key: str, value: Any):
+        self._entries[key] = value
 
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
 
-def get_latest_news(api_key: str):
+
+class RedisStore:
+    """SessionStore shared through Redis; entries expire ttl seconds after their last write, or never if ttl is None
+
+    Values are stored as orjson. encode and decode convert values that are not
+    JSON-compatible themselves, such as Keys, on the way in and out.
+    """
+
+    def __init__(self, client: redis.Redis, prefix: str, ttl: Optional[int],
+                 encode: Callable[[Any], Any] = lambda value: value,
+                 decode: Callable[[Any], Any] = lambda value: value):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.encode = encode
+        self.decode = decode
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        return self.decode(orjson.loads(raw)) if raw is not None else None
+
+    async def put(self, key: str, value: Any):
+        await self.client.set(self.prefix + key, orjson.dumps(self.encode(value)), ex=self.ttl)
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+
+async def load_keys(client_id: Optional[str]) -> Keys:
+    """Return the keys a client saved, or NO_KEYS"""
+    keys = await app.state.key_store.get(client_id) if client_id else None
+    return keys or NO_KEYS
+
+
+def get_session_lock(session_id: str) -> asyncio.Lock:
+    """Return the lock guarding a session's Gemini turns"""
+    lock = session_locks.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        session_locks[session_id] = lock
+    return lock
+
+
+def serialize_history(history) -> List[Dict[str, Any]]:
+    """Convert Gemini history to role/parts dicts, which start_chat accepts back as-is"""
+    return [
+        {"role": message.role, "parts": [part.text for part in message.parts if getattr(part, "text", "")]}
+        for message in history
+    ]
+
+
+async def load_chat_session(session_id: str, model: genai.GenerativeModel) -> genai.ChatSession:
+    """Start a chat on the session's stored history"""
+    history = await app.state.history_store.get(session_id)
+    return model.start_chat(history=history or [])
+
+
+async def save_chat_session(session_id: str, chat: genai.ChatSession, gemini_api_key: str):
+    """Store a chat's history as the session's history, summarizing whatever the window drops
+
+    The summary is billed to gemini_api_key, the key the session's turn ran on.
+    """
+    dropped = trim_chat_history(chat)
+    await app.state.history_store.put(session_id, serialize_history(chat.history))
+    if dropped:
+        task = asyncio.create_task(summarize_dropped_history(session_id, dropped, gemini_api_key))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
+def is_synopsis(message: Dict[str, Any]) -> bool:
+    """True for the user half of a stored synopsis pair"""
+    return message["role"] == "user" and bool(message["parts"]) and message["parts"][0].startswith(SYNOPSIS_PREFIX)
+
+
+async def summarize_dropped_history(session_id: str, dropped: List[Any], gemini_api_key: str):
+    """Condense messages cut from a session's window into a synopsis at the head of its history
+
+    Runs off the turn's critical path. An earlier synopsis sits at the head of
+    the window, so it is cut first and gets folded into the new one.
+    """
+    conversation = "\n".join(
+        f"{message.role}: " + " ".join(part.text for part in message.parts if getattr(part, "text", ""))
+        for message in dropped
+    )
+    try:
+        _, summary_model = get_gemini_models(gemini_api_key)
+        response = await summary_model.generate_content_async(SUMMARY_PROMPT + conversation)
+        synopsis = response.text.strip()
+    except Exception as e:
+        logger.error(f"Error summarizing history for session {session_id}: {e}")
+        return
+
+    async with get_session_lock(session_id):
+        history = await app.state.history_store.get(session_id)
+        if not history:
+            # Cleared while the summary was being written
+            return
+        await app.state.history_store.put(session_id, [
+            {"role": "user", "parts": [SYNOPSIS_PREFIX + synopsis]},
+            {"role": "model", "parts": [SYNOPSIS_ACK]},
+        ] + history)
+    logger.info(f"Summarized {len(dropped)} dropped messages for session: {session_id}")
+
+
+def estimate_tokens(message) -> int:
+    """Cheap token estimate for a Gemini history entry (about 4 characters per token)"""
+    text_length = sum(len(getattr(part, "text", "") or "") for part in message.parts)
+    return text_length // CHARS_PER_TOKEN + 1
+
+
+def trim_history(history) -> List[Any]:
+    """Apply deferred truncation to a Gemini history window"""
+    sizes = [estimate_tokens(message) for message in history]
+    if sum(sizes) <= 2 * MAX_HISTORY_TOKENS:
+        return list(history)
+
+    start = len(history)
+    kept_tokens = 0
+    while start > 0 and kept_tokens + sizes[start - 1] <= MAX_HISTORY_TOKENS:
+        start -= 1
+        kept_tokens += sizes[start]
+
+    # Gemini expects the history to open with a user turn
+    while start < len(history) and history[start].role != "user":
+        start += 1
+
+    logger.info(f"Reset history window: kept {len(history) - start} of {len(history)} messages (~{kept_tokens} tokens)")
+    return list(history[start:])
+
+
+def trim_chat_history(chat: genai.ChatSession) -> List[Any]:
+    """Trim a chat's history in place when its window is reset and return the dropped messages"""
+    history = chat.history
+    trimmed = trim_history(history)
+    if len(trimmed) < len(history):
+        chat.history = trimmed
+        return list(history[:len(history) - len(trimmed)])
+    return []
+
+
+async def send_message(websocket: WebSocket, message: BaseModel):
+    """Send a message model as a binary JSON frame, serialized by pydantic-core"""
+    await websocket.send_bytes(to_json(message))
+
+
+async def iter_queue(queue: asyncio.Queue) -> AsyncGenerator[Any, None]:
+    """Yield items from an asyncio.Queue until _END_OF_STREAM arrives"""
+    while True:
+        item = await queue.get()
+        if item is _END_OF_STREAM:
+            return
+        yield item
+
+
+def get_gemini_models(api_key: str) -> Tuple[genai.GenerativeModel, genai.GenerativeModel]:
+    """Return the chat and summary models for an API key, creating them on first use
+
+    genai.configure is process-wide and models pick up their client lazily, on
+    their first call. Binding the client right after configuring, with no await
+    in between, pins each model to its own key whatever is configured later.
+    """
+    models = app.state.gemini_models.get(api_key)
+    if models is None:
+        genai.configure(api_key=api_key)
+        async_client = genai_client.get_default_generative_async_client()
+        models = (
+            genai.GenerativeModel(GEMINI_MODEL_NAME, system_instruction=AI_SYSTEM_PROMPT),
+            genai.GenerativeModel(SUMMARY_MODEL_NAME),
+        )
+        for model in models:
+            model._async_client = async_client
+        app.state.gemini_models[api_key] = models
+    return models
+
+
+def get_gemini_model(api_key: str) -> genai.GenerativeModel:
+    """Return the chat model bound to an API key"""
+    return get_gemini_models(api_key)[0]
+
+
+async def warm_up_http(http: aiohttp.ClientSession):
+    """Open pooled connections to the HTTP APIs in the background, logging how long each took"""
+    async def warm_up(url: str):
+        started = time.perf_counter()
+        try:
+            async with http.head(url) as response:
+                status = response.status
+        except Exception as e:
+            logger.warning(f"Warm-up request to {url} failed: {e}")
+            return
+        logger.info("🔥 Warmed up %s in %.0f ms (HTTP %d)", url, (time.perf_counter() - started) * 1000, status)
+
+    await asyncio.gather(*(warm_up(url) for url in WARMUP_URLS))
+
+
+async def warm_up_gemini(model: genai.GenerativeModel):
+    """Open the Gemini channel with a free count_tokens call, logging how long it took"""
+    started = time.perf_counter()
+    try:
+        await model.count_tokens_async("ping")
+    except Exception as e:
+        logger.warning(f"Gemini warm-up failed: {e}")
+        return
+    logger.info("🔥 Warmed up Gemini in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+async def get_latest_news(api_key: str, http: aiohttp.ClientSession):
     """Fetches top 5 headlines using a more reliable query for the free plan."""
     if not api_key:
         return "News service is unavailable right now."
+
+    cached_summary = news_cache.get(api_key)
+    if cached_summary is not None:
+        return cached_summary
+
+    # Concurrent misses wait for a single fetch instead of each calling NewsAPI
+    async with app.state.news_lock:
+        cached_summary = news_cache.get(api_key)
+        if cached_summary is not None:
+            return cached_summary
+        return await fetch_latest_news(api_key, http)
+
+
+async def fetch_latest_news(api_key: str, http: aiohttp.ClientSession):
+    """Query NewsAPI and cache the headline summary on success."""
     try:
-        newsapi = NewsApiClient(api_key=api_key)
-        all_articles = newsapi.get_everything(q='AI', language='en', sort_by='publishedAt', page_size=5)
+        async with http.get(NEWS_API_URL, params=NEWS_API_PARAMS, headers={"X-Api-Key": api_key}) as response:
+            response.raise_for_status()
+            all_articles = await response.json(loads=orjson.loads)
         if all_articles['status'] == 'ok' and all_articles['articles']:
             headlines = [article['title'] for article in all_articles['articles']]
-            return "LATEST NEWS: " + "; ".join(headlines)
+            summary = "LATEST NEWS: " + "; ".join(headlines)
+            news_cache[api_key] = summary
+            return summary
         else:
             logger.warning(f"NewsAPI returned no articles: {all_articles}")
             return "Couldn't fetch the latest news right now."
     except Exception as e:
-        error_message = f"!!!!!!!!!! NEWSAPI ERROR !!!!!!!!!!!\n{e}\n!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!"
-        print(error_message)
         logger.error(f"Error fetching news: {e}")
         return "My spider-sense is a bit fuzzy on the news right now."
 
 
-async def stream_llm_response(user_text: str, session_id: str, api_keys: Dict[str, str]) -> AsyncGenerator[str, None]:
-    """Stream AI response using Gemini with real-time generation"""
+async def stream_llm_response(user_text: str, session_id: str, api_keys: Keys, http: aiohttp.ClientSession, on_chat: Optional[Callable[[genai.ChatSession], None]] = None) -> AsyncGenerator[str, None]:
+    """Stream AI response using Gemini with real-time generation
+
+    The turn runs on a chat started from the session's stored history, which is
+    saved back once the reply is complete. If on_chat is given the finished
+    chat is handed to it instead of being saved.
+    """
     try:
-        gemini_api_key = api_keys.get("gemini")
+        gemini_api_key = api_keys.gemini
         if not gemini_api_key:
             raise ValueError("Gemini API key is missing.")
-        genai.configure(api_key=gemini_api_key)
+        model = get_gemini_model(gemini_api_key)
 
-        news_keywords = ["news", "headlines", "latest", "happening"]
-        if any(keyword in user_text.lower() for keyword in news_keywords):
+        if NEWS_RE.search(user_text):
             logger.info("News keyword detected, fetching headlines...")
-            news_api_key = api_keys.get("newsapi")
-            news_summary = get_latest_news(news_api_key)
+            news_summary = await get_latest_news(api_keys.newsapi, http)
             user_text = f"{news_summary}. Based on these headlines, what should I tell the user?"
 
-        history = chat_histories.get(session_id, [])
+        accumulated_text = ""
 
-        model = genai.GenerativeModel(
-            "gemini-1.5-flash",
-            system_instruction=AI_SYSTEM_PROMPT
-        )
+        # Concurrent turns on one session would each start from the same
+        # history and the later save would silently drop the other turn
+        async with get_session_lock(session_id):
+            chat = await load_chat_session(session_id, model)
 
-        chat = model.start_chat(history=history)
-        
-        logger.info(f"Starting LLM streaming for: {user_text[:50]}...")
-        response = chat.send_message(user_text, stream=True)
-        
-        accumulated_text = ""
-        
-        for chunk in response:
-            if chunk.text:
-                chunk_text = chunk.text
-                accumulated_text += chunk_text
-                logger.info(f"LLM Chunk: '{chunk_text}'")
-                yield chunk_text
-        
-        chat_histories[session_id] = chat.history[-MAX_HISTORY_MESSAGES:]
+            logger.info(f"Starting LLM streaming for: {user_text[:50]}...")
+            response = await chat.send_message_async(user_text, stream=True)
+
+            async for chunk in response:
+                if chunk.text:
+                    chunk_text = chunk.text
+                    accumulated_text += chunk_text
+                    logger.debug("LLM chunk: %r", chunk_text)
+                    yield chunk_text
+
+            # A failed or abandoned turn never reaches this point, so the
+            # stored history only ever holds complete turns
+            if on_chat is not None:
+                on_chat(chat)
+            else:
+                await save_chat_session(session_id, chat, gemini_api_key)
         
-        logger.info(f"Complete LLM Response: {accumulated_text}")
+        logger.info("Complete LLM Response: %s", accumulated_text)
         
     except Exception as e:
         logger.error(f"Error in LLM streaming: {e}")
         yield FALLBACK_TEXT
 
 
-async def stream_murf_audio_websocket(text_stream: AsyncGenerator[str, None], api_keys: Dict[str, str], voice_id: str = "en-US-natalie") -> AsyncGenerator[str, None]:
-    """Stream text to Murf WebSocket and get back base64 audio chunks"""
+def normalize_transcript(text: str) -> str:
+    """Lowercase a transcript and strip punctuation so near-identical turns compare equal"""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+class SpeculationGate:
+    """Decides which partial transcripts are worth a speculative Gemini request"""
+
+    def __init__(self, min_confidence: float = SPECULATION_MIN_CONFIDENCE, min_words: int = SPECULATION_MIN_WORDS, min_interval: float = SPECULATION_MIN_INTERVAL):
+        self.min_confidence = min_confidence
+        self.min_words = min_words
+        self.min_interval = min_interval
+        self.last_started = float("-inf")
+
+    def should_speculate(self, transcript: str, end_of_turn_confidence: float, now: float) -> bool:
+        """True if a speculation should start now; records it as started if so"""
+        if end_of_turn_confidence < self.min_confidence:
+            return False
+        if len(normalize_transcript(transcript).split()) < self.min_words:
+            return False
+        if now - self.last_started < self.min_interval:
+            return False
+        self.last_started = now
+        return True
+
+
+class SpeculativeResponse:
+    """Gemini reply generated from a partial transcript before the turn has ended
+
+    Chunks are buffered in a queue while the user finishes speaking. If the final
+    transcript matches, the buffered (and still arriving) chunks are replayed and
+    the chat it ran on becomes the session's chat; otherwise the work is
+    cancelled and the session is left untouched.
+    """
+
+    def __init__(self, transcript: str, session_id: str, api_keys: Keys, http: aiohttp.ClientSession):
+        self.transcript = normalize_transcript(transcript)
+        self.chat: Optional[genai.ChatSession] = None
+        self.gemini_api_key = api_keys.gemini
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._generate(transcript, session_id, api_keys, http))
+        logger.info(f"Speculating on partial transcript: '{transcript}'")
+
+    async def _generate(self, transcript: str, session_id: str, api_keys: Keys, http: aiohttp.ClientSession):
+        try:
+            async for text_chunk in stream_llm_response(transcript, session_id, api_keys, http, on_chat=self._keep_chat):
+                self.queue.put_nowait(text_chunk)
+        finally:
+            self.queue.put_nowait(_END_OF_STREAM)
+
+    def _keep_chat(self, chat: genai.ChatSession):
+        self.chat = chat
+
+    def matches(self, transcript: str) -> bool:
+        return self.transcript == normalize_transcript(transcript)
+
+    def usable_for(self, transcript: str) -> bool:
+        """True if the speculation answers this transcript and has not failed"""
+        if not self.matches(transcript):
+            return False
+        return not (self.task.done() and self.chat is None)
+
+    def cancel(self):
+        self.task.cancel()
+
+    async def stream(self, session_id: str) -> AsyncGenerator[str, None]:
+        """Replay the speculative reply, then add its turn to the session's history"""
+        try:
+            async for text_chunk in iter_queue(self.queue):
+                yield text_chunk
+        finally:
+            # Stop generating if the turn is interrupted mid-replay
+            self.cancel()
+        if self.chat is not None:
+            async with get_session_lock(session_id):
+                # A summary may have rewritten the stored history since the
+                # speculation loaded it, so append its turn (the last user and
+                # model messages) to the history as it is now
+                history = await app.state.history_store.get(session_id) or []
+                new_turn = serialize_history(self.chat.history[-2:])
+                chat = self.chat.model.start_chat(history=history + new_turn)
+                await save_chat_session(session_id, chat, self.gemini_api_key)
+
+
+async def stream_murf_audio_websocket(text_stream: AsyncGenerator[str, None], api_keys: Keys, http: aiohttp.ClientSession, voice_id: str = "en-US-natalie") -> AsyncGenerator[bytes, None]:
+    """Stream text to Murf WebSocket and yield audio chunks as they arrive"""
+    murf_api_key = api_keys.murf
+    if not murf_api_key:
+        logger.error("Murf API key not available")
+        return
+
+    sent_text = ""
+    audio_sent = False
+
     try:
-        murf_api_key = api_keys.get("murf")
-        if not murf_api_key:
-            raise Exception("Murf API key not available")
-        
-        logger.info("🎵 Starting Murf audio streaming simulation...")
-        
-        accumulated_text = ""
-        chunk_count = 0
-        
-        async for text_chunk in text_stream:
-            if text_chunk.strip():
-                accumulated_text += text_chunk
-                chunk_count += 1
-                logger.info(f" LLM chunk {chunk_count}: '{text_chunk}'")
-        
-        if accumulated_text.strip():
-            logger.info(f"🎵 Generating audio for complete text: '{accumulated_text}'")
-            
+        async with websockets.connect(
+            MURF_WS_URL,
+            extra_headers={"api-key": murf_api_key},
+            max_size=None,
+            ping_interval=MURF_WS_PING_INTERVAL,
+            ping_timeout=MURF_WS_PING_TIMEOUT,
+            compression=None
+        ) as murf_ws:
+            logger.info("🎵 Connected to Murf WebSocket")
+            await murf_ws.send(orjson.dumps({
+                "context_id": MURF_CONTEXT_ID,
+                "voice_config": {"voiceId": voice_id}
+            }).decode())
+
+            async def send_text():
+                """Forward each LLM chunk to Murf as soon as it arrives"""
+                nonlocal sent_text
+                async for text_chunk in text_stream:
+                    if text_chunk.strip():
+                        sent_text += text_chunk
+                        await murf_ws.send(orjson.dumps({
+                            "context_id": MURF_CONTEXT_ID,
+                            "text": text_chunk,
+                            "end": False
+                        }).decode())
+                await murf_ws.send(orjson.dumps({
+                    "context_id": MURF_CONTEXT_ID,
+                    "text": "",
+                    "end": True
+                }).decode())
+
+            sender_task = asyncio.create_task(send_text())
             try:
-                audio_url = await generate_murf_audio_fallback(accumulated_text, murf_api_key, voice_id)
-                if audio_url:
-                    logger.info(f"✅ Murf REST API generated audio: {audio_url}")
-                    
-                    response = requests.get(audio_url, timeout=30)
-                    if response.status_code == 200:
-                        actual_base64 = base64.b64encode(response.content).decode()
-                        yield actual_base64
-                        return
-            except Exception as e:
-                logger.warning(f"Murf REST API fallback failed: {e}")
+                async for message in murf_ws:
+                    data = orjson.loads(message)
+                    if data.get("audio"):
+                        audio_sent = True
+                        yield base64.b64decode(data["audio"])
+                    if data.get("final"):
+                        break
+                await sender_task
+            except Exception:
+                # Let the sender fail on the closed socket rather than
+                # cancelling it, so text_stream stays usable for the fallback
+                await murf_ws.close()
+                await asyncio.gather(sender_task, return_exceptions=True)
+                raise
+            finally:
+                if not sender_task.done():
+                    sender_task.cancel()
 
-            # Fallback to mock audio if REST API fails
-            mock_audio_data = f"MOCK_AUDIO_FOR_{accumulated_text.replace(' ', '_').upper()}"
-            mock_base64 = base64.b64encode(mock_audio_data.encode()).decode()
-            yield mock_base64
-            
     except Exception as e:
         logger.error(f"Error in Murf audio streaming: {e}")
-        # Return mock audio instead of relying on missing fallback.mp3
+        if audio_sent:
+            return
+
+        # Fall back to the REST API for the text Murf already received plus
+        # whatever the LLM is still producing
+        async def remaining_text():
+            if sent_text:
+                yield sent_text
+            async for text_chunk in text_stream:
+                yield text_chunk
+
+        async for audio_bytes in stream_murf_rest_sentences(remaining_text(), murf_api_key, http, voice_id):
+            yield audio_bytes
+
+
+def split_sentences(text: str) -> Tuple[List[str], str]:
+    """Split buffered LLM text into complete sentences and the unfinished remainder"""
+    *sentences, pending = SENTENCE_END_RE.split(text)
+    if len(pending) > SENTENCE_MAX_CHARS:
+        cut = max(pending.rfind(", "), pending.rfind("; "))
+        if cut < 0:
+            cut = pending.rfind(" ")
+        if cut > 0:
+            sentences.append(pending[:cut + 1])
+            pending = pending[cut + 1:]
+    return sentences, pending
+
+
+async def stream_murf_rest_sentences(text_stream: AsyncGenerator[str, None], api_key: str, http: aiohttp.ClientSession, voice_id: str = "en-US-natalie") -> AsyncGenerator[bytes, None]:
+    """Render each sentence with the Murf REST API as soon as it is complete, yielding audio in order
+
+    The sentence being played streams straight through as its download
+    arrives; later sentences render ahead into their own queues.
+    """
+    renders: asyncio.Queue = asyncio.Queue()
+    render_tasks: List[asyncio.Task] = []
+    render_slots = asyncio.Semaphore(MURF_REST_MAX_RENDERS)
+
+    async def render(sentence: str, pieces: asyncio.Queue):
+        try:
+            async with render_slots:
+                async for piece in stream_murf_rest_audio(sentence, api_key, http, voice_id):
+                    pieces.put_nowait(piece)
+        except Exception as e:
+            logger.error(f"Error rendering sentence with Murf REST API: {e}")
+        finally:
+            pieces.put_nowait(_END_OF_STREAM)
+
+    def start_render(sentence: str):
+        if sentence.strip():
+            pieces: asyncio.Queue = asyncio.Queue()
+            render_tasks.append(asyncio.create_task(render(sentence.strip(), pieces)))
+            renders.put_nowait(pieces)
+
+    async def dispatch_sentences():
+        pending = ""
         try:
-            mock_audio_data = "MOCK_FALLBACK_AUDIO"
-            mock_base64 = base64.b64encode(mock_audio_data.encode()).decode()
-            yield mock_base64
-        except:
-            yield ""  # Return empty string if all else fails
+            async for text_chunk in text_stream:
+                sentences, pending = split_sentences(pending + text_chunk)
+                for sentence in sentences:
+                    start_render(sentence)
+            start_render(pending)
+        finally:
+            renders.put_nowait(_END_OF_STREAM)
 
+    dispatcher = asyncio.create_task(dispatch_sentences())
+    try:
+        # Renders run concurrently but are queued in sentence order
+        async for pieces in iter_queue(renders):
+            async for piece in iter_queue(pieces):
+                yield piece
+        await dispatcher
+    finally:
+        dispatcher.cancel()
+        for task in render_tasks:
+            task.cancel()
+
+
+async def stream_murf_rest_audio(text: str, api_key: str, http: aiohttp.ClientSession, voice_id: str = "en-US-natalie") -> AsyncGenerator[bytes, None]:
+    """Render text with the Murf REST API and stream the MP3 back in pieces"""
+    cache_key = TTSCache.key(text, voice_id)
+    cached_pieces = tts_cache.get(cache_key)
+    if cached_pieces is not None:
+        logger.info("✅ Serving Murf audio from cache")
+        for piece in cached_pieces:
+            yield piece
+        return
+
+    audio_url = await generate_murf_audio_fallback(text, api_key, http, voice_id)
+    if not audio_url:
+        return
 
-async def generate_murf_audio_fallback(text: str, api_key: str, voice_id: str = "en-US-natalie") -> str:
+    logger.info(f"✅ Murf REST API generated audio: {audio_url}")
+    pieces: List[bytes] = []
+    try:
+        async with http.get(audio_url) as response:
+            response.raise_for_status()
+            async for piece in response.content.iter_chunked(MURF_AUDIO_CHUNK_SIZE):
+                pieces.append(piece)
+                yield piece
+    except Exception as e:
+        logger.error(f"Error downloading Murf audio: {e}")
+        return
+
+    tts_cache.put(cache_key, pieces)
+
+
+async def generate_murf_audio_fallback(text: str, api_key: str, http: aiohttp.ClientSession, voice_id: str = "en-US-natalie") -> str:
     """Fallback to regular Murf REST API"""
     try:
         if not api_key:
             return None
         
-        payload = {
-            "text": text,
-            "voiceId": voice_id,
-            "format": "MP3",
-            "rate": 0,
-            "pitch": 0,
-            "emphasis": {}
-        }
+        payload = {**MURF_PAYLOAD_BASE, "text": text, "voiceId": voice_id}
+        headers = {**MURF_HEADERS_BASE, "api-key": api_key}
         
-        headers = {
-            "api-key": api_key,
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(
-            "https://api.murf.ai/v1/speech/generate",
-            json=payload,
-            headers=headers,
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        result = response.json()
+        async with http.post(MURF_REST_URL, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            result = await response.json(loads=orjson.loads)
         
         audio_url = result.get("audioFile")
         return audio_url
@@ -250,26 +962,33 @@ async def generate_murf_audio_fallback(text: str, api_key: str, voice_id: str =
         return None
 
 @app.post("/api/keys")
-async def set_api_keys(keys: ApiKeys):
-    """Receive and store API keys from the user."""
-    global user_api_keys
-    user_api_keys = {
-        "assemblyai": keys.assemblyai,
-        "gemini": keys.gemini,
-        "murf": keys.murf,
-        "newsapi": keys.newsapi
-    }
+async def set_api_keys(keys: ApiKeys, client_id: str = Header(..., alias="X-Client-Id")):
+    """Receive and store API keys for the calling browser client."""
+    await app.state.key_store.put(client_id, Keys(
+        assemblyai=keys.assemblyai,
+        gemini=keys.gemini,
+        murf=keys.murf,
+        newsapi=keys.newsapi
+    ))
+    if keys.gemini not in app.state.gemini_models:
+        # Keys only arrive from the UI, so this is the earliest Gemini can be
+        # warmed. The new model is bound to this key alone; other clients'
+        # models keep their own clients.
+        task = asyncio.create_task(warm_up_gemini(get_gemini_model(keys.gemini)))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
     logger.info("Received and stored new API keys.")
     return {"message": "API keys updated successfully."}
 
 @app.get("/api/keys")
-async def get_api_keys():
-    """Return the currently stored API keys."""
+async def get_api_keys(client_id: str = Header(..., alias="X-Client-Id")):
+    """Return the API keys stored for the calling browser client."""
+    keys = await load_keys(client_id)
     return {
-        "ASSEMBLYAI_API_KEY": user_api_keys.get("assemblyai"),
-        "GEMINI_API_KEY": user_api_keys.get("gemini"),
-        "MURF_API_KEY": user_api_keys.get("murf"),
-        "NEWS_API_KEY": user_api_keys.get("newsapi"),
+        "ASSEMBLYAI_API_KEY": keys.assemblyai or None,
+        "GEMINI_API_KEY": keys.gemini or None,
+        "MURF_API_KEY": keys.murf or None,
+        "NEWS_API_KEY": keys.newsapi or None,
     }
 
 @app.get("/")
@@ -286,139 +1005,266 @@ async def websocket_audio_endpoint(websocket: WebSocket):
     await websocket.accept()
     logger.info("WebSocket connection established")
     
-    # --- MODIFIED: Use the globally stored user_api_keys ---
-    api_keys = user_api_keys.copy()
+    # The page passes its conversation id and the browser's client id, so
+    # turns land in the history it displays and use the keys it saved
+    session_id = websocket.query_params.get("session") or str(uuid.uuid4())
+    client_id = websocket.query_params.get("client")
+    api_keys = await load_keys(client_id)
     
-    assembly_key = api_keys.get("assemblyai")
-    if not all(api_keys.values()):
+    if not api_keys.complete():
         logger.error("One or more API keys are not available")
-        await websocket.send_json({
-            "type": "error",
-            "message": "All API keys are required. Please configure them in the settings."
-        })
+        await send_message(websocket, ErrorMessage(
+            message="All API keys are required. Please configure them in the settings."
+        ))
+        await websocket.close()
+        return
+
+    # Reserve an executor thread for this connection's AssemblyAI stream. A
+    # stream queued behind busy threads would get no audio and time out.
+    if websocket.app.state.active_streams >= ASSEMBLY_MAX_WORKERS:
+        logger.warning(f"All {ASSEMBLY_MAX_WORKERS} transcription slots are in use, rejecting connection")
+        await send_message(websocket, ErrorMessage(
+            message="The server is busy right now. Please try again in a moment."
+        ))
         await websocket.close()
         return
     
     streaming_client = None
     transcript_queue = asyncio.Queue()
     current_loop = asyncio.get_running_loop()
-    session_id = str(uuid.uuid4())
     
-    is_processing_llm = False
+    current_turn: Optional[asyncio.Task] = None
+    speculation: Optional[SpeculativeResponse] = None
+    speculation_gate = SpeculationGate()
 
     def on_begin(client, event: BeginEvent):
         logger.info(f"Streaming session started: {event.id}")
     
-    def on_turn(client, event: TurnEvent):
-        """Handle turn events from AssemblyAI"""
-        nonlocal is_processing_llm
+    async def process_llm_and_audio(transcript: str, turn_ended_at: float, text_stream: Optional[AsyncGenerator[str, None]] = None):
+        """Stream the reply for a finished turn to the browser as text and audio
+
+        turn_ended_at is the perf_counter() reading when the end of turn was
+        detected, from which time to first token is measured.
+        """
+        if text_stream is None:
+            text_stream = stream_llm_response(transcript, session_id, api_keys, websocket.app.state.http)
+        try:
+            # Acknowledge the turn before any Gemini or news work starts
+            try:
+                await send_message(websocket, LlmStartMessage())
+            except RuntimeError:
+                logger.warning("WebSocket already closed, cannot send llm_start.")
+                return
+
+            # Gemini output is teed: text frames go to the browser
+            # while Murf reads the same chunks from tts_queue, so
+            # audio starts before the LLM has finished
+            tts_queue: asyncio.Queue = asyncio.Queue()
+            accumulated_text = ""
+
+            # Chunks are coalesced and shipped together, one frame in
+            # flight at a time, so a reply costs a handful of sends
+            pending_chunks: List[str] = []
+
+            async def flush_pending_chunks():
+                if pending_chunks:
+                    texts = pending_chunks[:]
+                    pending_chunks.clear()
+                    await send_message(websocket, LlmChunkBatchMessage(texts=texts))
+
+            async def forward_llm_chunks():
+                nonlocal accumulated_text
+                # The next flush: sleeping out the rest of the interval, then
+                # sending. Held-back chunks go out on time even if Gemini pauses.
+                send_task: Optional[asyncio.Task] = None
+                sending = False
+                last_flush = float("-inf")
+
+                async def flush_after(delay: float):
+                    nonlocal sending, last_flush
+                    await asyncio.sleep(delay)
+                    sending = True
+                    last_flush = time.monotonic()
+                    try:
+                        await flush_pending_chunks()
+                    finally:
+                        sending = False
+
+                def schedule_flush():
+                    nonlocal send_task
+                    if send_task is not None and not send_task.done():
+                        if sending or len(pending_chunks) <= LLM_CHUNK_MAX_PENDING:
+                            return
+                        # Too many chunks held back: send now instead of waiting
+                        send_task.cancel()
+                    elif send_task is not None:
+                        send_task.result()
+                    if len(pending_chunks) > LLM_CHUNK_MAX_PENDING:
+                        delay = 0.0
+                    else:
+                        delay = max(0.0, last_flush + LLM_CHUNK_FLUSH_INTERVAL - time.monotonic())
+                    send_task = asyncio.create_task(flush_after(delay))
+
+                try:
+                    async for text_chunk in text_stream:
+                        if text_chunk:
+                            await tts_queue.put(text_chunk)
+                            if not accumulated_text:
+                                ttft_ms = (time.perf_counter() - turn_ended_at) * 1000
+                                logger.info("⏱️ First LLM token %.0f ms after end of turn", ttft_ms)
+                                await send_message(websocket, FirstTokenMessage(
+                                    ts=time.time() * 1000,
+                                    ttft_ms=round(ttft_ms)
+                                ))
+                            accumulated_text += text_chunk
+                            pending_chunks.append(text_chunk)
+                            schedule_flush()
+                    if send_task is not None:
+                        if not send_task.done() and not sending:
+                            # The stream is over, so don't sleep out the interval
+                            send_task.cancel()
+                            await asyncio.gather(send_task, return_exceptions=True)
+                        else:
+                            await send_task
+                    await flush_pending_chunks()
+                finally:
+                    if send_task is not None:
+                        send_task.cancel()
+                    # Closing the stream releases the session lock if the
+                    # turn is interrupted while the LLM is still replying
+                    await text_stream.aclose()
+                    tts_queue.put_nowait(_END_OF_STREAM)
+
+            llm_task = asyncio.create_task(forward_llm_chunks())
+            audio_chunk_count = 0
+            audio_byte_count = 0
+            audio_stream = stream_murf_audio_websocket(iter_queue(tts_queue), api_keys, websocket.app.state.http)
+            try:
+                async for audio_bytes in audio_stream:
+                    if audio_bytes:
+                        await websocket.send_bytes(AUDIO_FRAME_TAG + audio_bytes)
+                        audio_chunk_count += 1
+                        audio_byte_count += len(audio_bytes)
+                        logger.debug("Sent audio chunk %d to frontend (%d bytes)", audio_chunk_count, len(audio_bytes))
+                logger.info("📡 Sent %d audio chunks to frontend (%d bytes)", audio_chunk_count, audio_byte_count)
+                await llm_task
+            except RuntimeError:
+                logger.warning("WebSocket already closed, cannot stream the response.")
+                return
+            finally:
+                await audio_stream.aclose()
+                if not llm_task.done():
+                    llm_task.cancel()
+                    await asyncio.gather(llm_task, return_exceptions=True)
+
+            try:
+                await send_message(websocket, LlmCompleteMessage(
+                    text=accumulated_text or "Response generated successfully"
+                ))
+            except RuntimeError:
+                logger.warning("WebSocket already closed, cannot send llm_complete.")
+                return
+
+        except Exception as e:
+            logger.error(f"Error in LLM/Audio processing: {e}")
+            try:
+                await send_message(websocket, LlmErrorMessage(message=f"Error: {str(e)}"))
+            except RuntimeError:
+                 logger.warning("WebSocket already closed, cannot send llm_error.")
 
+    async def start_turn(previous_turn: Optional[asyncio.Task], transcript: str, turn_ended_at: float, text_stream: Optional[AsyncGenerator[str, None]]):
+        """Interrupt the previous reply, then answer the new turn
+
+        The interrupt goes out even when the previous task has finished:
+        Murf renders faster than real time, so the browser is usually still
+        playing a reply the server is done with.
+        """
+        if previous_turn is not None and not previous_turn.done():
+            logger.info("User spoke over the reply, interrupting it")
+            previous_turn.cancel()
+            await asyncio.gather(previous_turn, return_exceptions=True)
+        try:
+            await send_message(websocket, InterruptMessage())
+        except RuntimeError:
+            logger.warning("WebSocket already closed, cannot send interrupt.")
+            return
+        await process_llm_and_audio(transcript, turn_ended_at, text_stream)
+
+    def handle_turn(transcript: str, end_of_turn: bool, end_of_turn_confidence: float):
+        """Start, reuse or discard LLM work for a transcript update (runs on the event loop)"""
+        nonlocal current_turn, speculation
+        turn_in_progress = current_turn is not None and not current_turn.done()
+
+        if not end_of_turn:
+            if turn_in_progress:
+                return
+            # The user is probably about to stop: start generating from the
+            # partial so Gemini's cold start overlaps the end of the utterance
+            if speculation and speculation.matches(transcript):
+                return
+            if speculation_gate.should_speculate(transcript, end_of_turn_confidence, time.monotonic()):
+                if speculation:
+                    speculation.cancel()
+                speculation = SpeculativeResponse(transcript, session_id, api_keys, websocket.app.state.http)
+            return
+
+        if not transcript.strip():
+            return
+
+        text_stream = None
+        if speculation and speculation.usable_for(transcript):
+            logger.info("Final transcript matches speculation, reusing its response")
+            text_stream = speculation.stream(session_id)
+        elif speculation:
+            speculation.cancel()
+        speculation = None
+
+        # A new turn barges in on the current one instead of being dropped
+        current_turn = current_loop.create_task(start_turn(current_turn, transcript, time.perf_counter(), text_stream))
+
+    def on_turn(client, event: TurnEvent):
+        """Handle turn events from AssemblyAI (called on the SDK's streaming thread)"""
         if hasattr(event, 'transcript') and event.transcript:
-            transcript_data = {
-                "type": "transcript",
-                "text": event.transcript,
-                "is_final": event.end_of_turn,
-                "end_of_turn": event.end_of_turn
-            }
+            transcript_data = TranscriptMessage(
+                text=event.transcript,
+                is_final=event.end_of_turn,
+                end_of_turn=event.end_of_turn
+            )
             
             current_loop.call_soon_threadsafe(
                 transcript_queue.put_nowait, 
                 transcript_data
             )
             
-            logger.info(f"Transcript: '{event.transcript}' (final: {event.end_of_turn})")
-            
-            if event.end_of_turn and event.transcript.strip() and not is_processing_llm:
-                is_processing_llm = True
-                async def process_llm_and_audio():
-                    nonlocal is_processing_llm
-                    try:
-                        try:
-                            await websocket.send_json({
-                                "type": "llm_start",
-                                "message": "Generating AI response..."
-                            })
-                        except RuntimeError:
-                            logger.warning("WebSocket already closed, cannot send llm_start.")
-                            return
-
-                        text_stream = stream_llm_response(event.transcript, session_id, api_keys)
-                        
-                        accumulated_text = ""
-                        text_chunks_for_audio = []
-                        
-                        async for text_chunk in text_stream:
-                            if text_chunk:
-                                accumulated_text += text_chunk
-                                text_chunks_for_audio.append(text_chunk)
-                                
-                                try:
-                                    await websocket.send_json({
-                                        "type": "llm_chunk",
-                                        "text": text_chunk,
-                                        "accumulated": accumulated_text
-                                    })
-                                except RuntimeError:
-                                    logger.warning("WebSocket already closed, cannot send llm_chunk.")
-                                    return
-
-                        if text_chunks_for_audio:
-                            async def create_text_stream():
-                                for chunk in text_chunks_for_audio:
-                                    yield chunk
-                            
-                            audio_stream = stream_murf_audio_websocket(create_text_stream(), api_keys)
-                            
-                            async for audio_base64 in audio_stream:
-                                if audio_base64:
-                                    try:
-                                        await websocket.send_json({
-                                            "type": "audio_chunk",
-                                            "audio_base64": audio_base64,
-                                            "format": "mp3"
-                                        })
-                                        logger.info(f"📡 Sent audio chunk to frontend ({len(audio_base64)} chars)")
-                                    except RuntimeError:
-                                        logger.warning("WebSocket already closed, cannot send audio_chunk.")
-                                        return
-                        
-                        try:
-                            await websocket.send_json({
-                                "type": "llm_complete",
-                                "text": accumulated_text or "Response generated successfully"
-                            })
-                        except RuntimeError:
-                            logger.warning("WebSocket already closed, cannot send llm_complete.")
-                            return
+            logger.log(
+                logging.INFO if event.end_of_turn else logging.DEBUG,
+                "Transcript: %r (final: %s)", event.transcript, event.end_of_turn
+            )
 
-                    except Exception as e:
-                        logger.error(f"Error in LLM/Audio processing: {e}")
-                        try:
-                            await websocket.send_json({
-                                "type": "llm_error",
-                                "message": f"Error: {str(e)}"
-                            })
-                        except RuntimeError:
-                             logger.warning("WebSocket already closed, cannot send llm_error.")
-                    finally:
-                        is_processing_llm = False
-                
-                current_loop.create_task(process_llm_and_audio())
+            current_loop.call_soon_threadsafe(
+                handle_turn,
+                event.transcript,
+                event.end_of_turn,
+                getattr(event, "end_of_turn_confidence", 0.0) or 0.0
+            )
     
     def on_error(client, error: StreamingError):
         logger.error(f"Streaming error: {error}")
         current_loop.call_soon_threadsafe(
             transcript_queue.put_nowait,
-            {"type": "error", "message": str(error)}
+            ErrorMessage(message=str(error))
         )
     
     def on_terminated(client, event: TerminationEvent):
         logger.info(f"Streaming session terminated")
     
+    websocket.app.state.active_streams += 1
+    if websocket.app.state.active_streams == ASSEMBLY_MAX_WORKERS:
+        logger.warning(f"Transcription slots saturated ({ASSEMBLY_MAX_WORKERS} streams)")
     try:
         streaming_client = StreamingClient(
             StreamingClientOptions(
-                api_key=assembly_key,
+                api_key=api_keys.assemblyai,
                 api_host="streaming.assemblyai.com"
             )
         )
@@ -430,19 +1276,22 @@ async def websocket_audio_endpoint(websocket: WebSocket):
         
         streaming_client.connect(
             StreamingParameters(
-                sample_rate=16000,
-                format_turns=True
+                sample_rate=16000
             )
         )
         
-        import queue
         import threading
         
-        audio_queue = queue.Queue(maxsize=100)
-        keep_running = asyncio.Event()
+        audio_queue: janus.Queue = janus.Queue(maxsize=AUDIO_QUEUE_MAXSIZE)
+        keep_running = threading.Event()  # read from the streaming thread
         keep_running.set()
         
         class AudioIterator:
+            """Blocking iterator over microphone frames for the AssemblyAI SDK
+
+            Waits on the queue without polling or silence padding; the browser
+            streams frames continuously, so no keepalive is needed here.
+            """
             def __init__(self, audio_queue, keep_running_event):
                 self.audio_queue = audio_queue
                 self.keep_running = keep_running_event
@@ -454,12 +1303,12 @@ async def websocket_audio_endpoint(websocket: WebSocket):
                 if not self.keep_running.is_set():
                     raise StopIteration
                 
-                try:
-                    return self.audio_queue.get(timeout=0.1)
-                except queue.Empty:
-                    return b'\x00' * 3200
+                item = self.audio_queue.get()
+                if item is _END_OF_STREAM:
+                    raise StopIteration
+                return item
         
-        audio_iterator = AudioIterator(audio_queue, keep_running)
+        audio_iterator = AudioIterator(audio_queue.sync_q, keep_running)
         
         def run_streaming():
             try:
@@ -467,35 +1316,46 @@ async def websocket_audio_endpoint(websocket: WebSocket):
             except Exception as e:
                 logger.error(f"Streaming error: {e}")
         
-        import concurrent.futures
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-        streaming_task = current_loop.run_in_executor(executor, run_streaming)
+        streaming_task = current_loop.run_in_executor(websocket.app.state.assembly_executor, run_streaming)
         
         async def send_transcripts():
             while True:
                 try:
                     transcript_data = await transcript_queue.get()
-                    await websocket.send_json(transcript_data)
+                    await send_message(websocket, transcript_data)
                 except Exception as e:
                     logger.error(f"Error sending transcript: {e}")
                     break
         
         transcript_task = asyncio.create_task(send_transcripts())
         
+        # Warn once per excursion above the watermark rather than per frame
+        queue_under_pressure = False
         try:
             while True:
                 try:
                     message = await websocket.receive()
-                    
-                    if "bytes" in message:
-                        audio_data = message["bytes"]
-                        if not audio_queue.full():
-                            audio_queue.put(audio_data)
-                    elif "text" in message:
-                        text_msg = message["text"]
-                        if text_msg == "EOF":
-                            logger.info("Received EOF signal")
-                            break
+                    if message["type"] == "websocket.disconnect":
+                        logger.info("WebSocket disconnected")
+                        break
+
+                    audio_data = message.get("bytes")
+                    if audio_data:
+                        queue_size = audio_queue.async_q.qsize()
+                        if queue_size >= AUDIO_QUEUE_HIGH_WATERMARK:
+                            if not queue_under_pressure:
+                                logger.warning(f"Audio queue under pressure ({queue_size}/{AUDIO_QUEUE_MAXSIZE} frames)")
+                                queue_under_pressure = True
+                        elif queue_under_pressure:
+                            logger.info(f"Audio queue back below {AUDIO_QUEUE_HIGH_WATERMARK} frames")
+                            queue_under_pressure = False
+                        try:
+                            await asyncio.wait_for(audio_queue.async_q.put(audio_data), timeout=AUDIO_QUEUE_PUT_TIMEOUT)
+                        except asyncio.TimeoutError:
+                            logger.error(f"Recognizer stalled for {AUDIO_QUEUE_PUT_TIMEOUT}s, dropping audio frame")
+                    elif message.get("text") == "EOF":
+                        logger.info("Received EOF signal")
+                        break
                 
                 except WebSocketDisconnect:
                     logger.info("WebSocket disconnected")
@@ -503,7 +1363,14 @@ async def websocket_audio_endpoint(websocket: WebSocket):
                     
         finally:
             keep_running.clear()
-            streaming_task.cancel()
+            if speculation:
+                speculation.cancel()
+            if current_turn:
+                current_turn.cancel()
+            try:
+                audio_queue.async_q.put_nowait(_END_OF_STREAM)
+            except asyncio.QueueFull:
+                pass  # the iterator sees keep_running cleared on its next item
             transcript_task.cancel()
             
             if streaming_client:
@@ -511,14 +1378,21 @@ async def websocket_audio_endpoint(websocket: WebSocket):
                     streaming_client.disconnect(terminate=True)
                 except:
                     pass
+
+            # Cancelling the future would not stop the thread, so wait for
+            # stream() to return and free its executor slot
+            try:
+                await asyncio.wait_for(streaming_task, timeout=ASSEMBLY_SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("AssemblyAI streaming thread did not stop in time")
+            audio_queue.close()
+            await audio_queue.wait_closed()
     
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        await websocket.send_json({
-            "type": "error",
-            "message": f"Connection error: {str(e)}"
-        })
+        await send_message(websocket, ErrorMessage(message=f"Connection error: {str(e)}"))
     finally:
+        websocket.app.state.active_streams -= 1
         if streaming_client:
             try:
                 streaming_client.disconnect(terminate=True)
@@ -529,13 +1403,15 @@ async def websocket_audio_endpoint(websocket: WebSocket):
 @app.get("/agent/history/{session_id}")
 async def get_chat_history(session_id: str):
     """Get chat history for a session"""
-    history = chat_histories.get(session_id, [])
+    history = await app.state.history_store.get(session_id) or []
+    if history and is_synopsis(history[0]):
+        history = history[2:]
     
     formatted_history = []
     for msg in history:
-        if hasattr(msg, 'parts') and msg.parts:
-            content = msg.parts[0].text if msg.parts[0].text else ""
-            role = "user" if msg.role == "user" else "ai"
+        if msg["parts"]:
+            content = msg["parts"][0]
+            role = "user" if msg["role"] == "user" else "ai"
             formatted_history.append({
                 "role": role,
                 "content": content,
@@ -548,38 +1424,51 @@ async def get_chat_history(session_id: str):
 @app.delete("/agent/history/{session_id}")
 async def clear_chat_history(session_id: str):
     """Clear chat history for a session"""
-    if session_id in chat_histories:
-        del chat_histories[session_id]
-        logger.info(f"Cleared history for session: {session_id}")
+    await app.state.history_store.delete(session_id)
+    logger.info(f"Cleared history for session: {session_id}")
     
     return {"message": "History cleared", "session_id": session_id}
 
 
 @app.get("/health")
-async def health_check():
-    """Health check endpoint"""
+async def health_check(client_id: Optional[str] = Header(None, alias="X-Client-Id")):
+    """Health check endpoint; API key flags refer to the calling client"""
+    keys = await load_keys(client_id)
     return {
         "status": "healthy",
         "service": "Murf AI Agent - Streaming Edition",
         "apis": {
-            "assemblyai": bool(user_api_keys.get("assemblyai")),
-            "gemini": bool(user_api_keys.get("gemini")),
-            "murf": bool(user_api_keys.get("murf")),
-            "newsapi": bool(user_api_keys.get("newsapi"))
+            "assemblyai": bool(keys.assemblyai),
+            "gemini": bool(keys.gemini),
+            "murf": bool(keys.murf),
+            "newsapi": bool(keys.newsapi)
         },
         "features": {
             "streaming_llm": True,
             "streaming_audio": True,
             "websocket_integration": True,
-            "base64_audio": True,
+            "binary_audio": True,
             "news_skill": True
         },
+        "history_backend": HISTORY_BACKEND,
         "murf_context_id": MURF_CONTEXT_ID,
         "timestamp": datetime.now().isoformat()
     }
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Session state (API keys, chat history) lives in this process, so keep a
+    # single worker unless WEB_CONCURRENCY is raised deliberately.
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws_per_message_deflate=False
+    )
 
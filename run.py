@@ -4,27 +4,48 @@ Startup script for the Murf AI Voice Agent
 Simple launcher with dependency validation
 """
 
+import importlib.util
 import os
 import sys
 import subprocess
 
+REQUIRED_MODULES = (
+    "fastapi",
+    "uvicorn",
+    "assemblyai",
+    "google.generativeai",
+    "websockets",
+    "aiohttp",
+    "orjson",
+    "cachetools",
+    "redis",
+    "janus",
+    "pydantic",
+    "jinja2",
+    "httptools",
+)
+# uvicorn is started on uvloop everywhere except Windows
+if sys.platform != "win32":
+    REQUIRED_MODULES += ("uvloop",)
+
 def check_dependencies():
-    """Check if all required packages are installed"""
-    try:
-        import fastapi
-        import uvicorn
-        import assemblyai
-        import google.generativeai
-        import requests
-        import websockets
-        import aiohttp
-        import newsapi
-        print("✅ All dependencies are installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
-        print("Please run: pip install -r requirements.txt")
-        return False
+    """Check if all required packages are installed
+
+    Uses find_spec, which locates each module without running it, so the
+    check doesn't pay for importing the SDKs before the app imports them.
+    """
+    for module in REQUIRED_MODULES:
+        try:
+            missing = importlib.util.find_spec(module) is None
+        except ModuleNotFoundError:
+            # A dotted name whose parent package is missing
+            missing = True
+        if missing:
+            print(f"❌ Missing dependency: {module}")
+            print("Please run: pip install -r requirements.txt")
+            return False
+    print("✅ All dependencies are installed")
+    return True
 
 def main():
     """Main startup function"""
@@ -46,11 +67,19 @@ def main():
         import uvicorn
         port = int(os.environ.get("PORT", 8000))
         host = "0.0.0.0" if os.environ.get("RENDER") else "127.0.0.1"
+        # API keys and chat history are process-local unless
+        # HISTORY_BACKEND=redis, so only raise this together with that
+        workers = int(os.environ.get("WEB_CONCURRENCY", 1))
         uvicorn.run(
             "app:app",
             host=host,
             port=port,
-            reload=False if os.environ.get("RENDER") else True,
+            reload=not os.environ.get("RENDER") and workers == 1,
+            workers=workers,
+            loop="asyncio" if sys.platform == "win32" else "uvloop",
+            http="httptools",
+            ws="websockets",
+            ws_per_message_deflate=False,
             log_level="info"
         )
     except KeyboardInterrupt:
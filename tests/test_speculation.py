@@ -0,0 +1,32 @@
+from app import SPECULATION_MIN_INTERVAL, SpeculationGate
+
+
+def partials(sentence: str):
+    """Every growing prefix of a sentence, the way AssemblyAI streams partials"""
+    words = sentence.split()
+    return [" ".join(words[:i]) for i in range(1, len(words) + 1)]
+
+
+def test_stream_of_partials_starts_bounded_speculations():
+    gate = SpeculationGate()
+    updates = partials("can you tell me what the weather is going to be like in london tomorrow afternoon")
+    step = 0.1
+    started = sum(
+        gate.should_speculate(transcript, 0.95, i * step)
+        for i, transcript in enumerate(updates)
+    )
+    duration = len(updates) * step
+    assert 1 <= started <= int(duration / SPECULATION_MIN_INTERVAL) + 1
+
+
+def test_low_confidence_partials_never_speculate():
+    gate = SpeculationGate()
+    updates = partials("what time does the museum open on sundays")
+    assert not any(gate.should_speculate(t, 0.5, i * 10.0) for i, t in enumerate(updates))
+
+
+def test_short_partials_never_speculate():
+    gate = SpeculationGate()
+    assert not gate.should_speculate("hey", 0.99, 0.0)
+    assert not gate.should_speculate("hey there", 0.99, 10.0)
+    assert gate.should_speculate("hey there friend", 0.99, 20.0)